@@ -1,12 +1,35 @@
-from agent.strategies import run_cot, run_self_critique, run_self_consistency, is_numeric_question
+from agent.strategies import run_cot, run_factoid, run_self_critique, run_self_consistency, run_mc_logprob, is_numeric_question, is_multiple_choice, strategy_fingerprint
 import re
 
+STRATEGIES = {
+    "self_consistency": run_self_consistency,
+    "self_critique": run_self_critique,
+    "mc_logprob": run_mc_logprob,
+    "cot": run_cot,
+    "factoid": run_factoid,
+}
+
+# Cheaper stand-ins used when a run falls behind its deadline
+DEGRADED_ROUTES = {
+    "self_consistency": "cot",
+    "self_critique": "factoid",
+}
+
 class CoreAgent:
     def __init__(self):
         pass
 
-    def run(self, question: str, domain: str | None = None) -> str:
+    def route(self, question: str, degraded: bool = False) -> str:
         q = (question or "").strip()
+        route = self._full_route(q)
+        if degraded:
+            return DEGRADED_ROUTES.get(route, route)
+        return route
+
+    def _full_route(self, q: str) -> str:
+        # Multiple choice is scored from one token's logprobs
+        if is_multiple_choice(q):
+            return "mc_logprob"
 
         # Math detection rules
         main_q = q.split("Context:", 1)[0].strip().lower()
@@ -33,11 +56,21 @@ class CoreAgent:
 
         # Route to correct strategy
         if is_math:
-            answer = run_self_consistency(q, domain)
-        else:
-            answer = run_self_critique(q, domain)
+            return "self_consistency"
+        return "self_critique"
+
+    def fingerprint(self, question: str, degraded: bool = False) -> str:
+        """Fingerprint of the route and strategy versions this question would use."""
+        q = (question or "").strip()
+        return strategy_fingerprint(self.route(q, degraded), q)
+
+    def run(self, question: str, domain: str | None = None, degraded: bool = False) -> str:
+        q = (question or "").strip()
+
+        answer = STRATEGIES[self.route(q, degraded)](q, domain)
 
-        if not answer:
+        # run_cot is a route of its own now, so surface its failure marker
+        if not answer or answer == "MODEL_CALL_FAILED":
             return "ERROR"
 
         return answer.strip()
@@ -1,8 +1,8 @@
 import os 
 import time
 import random
-import threading
 import requests
+from agent.concurrency import ConcurrencyController
 
 API_KEY = os.getenv("OPENAI_API_KEY", "cse476")
 API_BASE = os.getenv("API_BASE", "http://10.4.58.53:41701/v1")
@@ -13,28 +13,74 @@ MAX_RETRIES = 5
 INITIAL_BACKOFF = 2
 MAX_BACKOFF = 30
 
-# Global semaphore to limit concurrent API calls
-MAX_CONCURRENT_API_CALLS = 20
-_api_semaphore = threading.Semaphore(MAX_CONCURRENT_API_CALLS)
+# Concurrency bounds; the shared controller tunes the in-flight limit
+# between these while the run is in progress
+INITIAL_CONCURRENT_API_CALLS = int(os.getenv("INITIAL_CONCURRENT_API_CALLS", "20"))
+MAX_CONCURRENT_API_CALLS = int(os.getenv("MAX_CONCURRENT_API_CALLS", "48"))
+api_controller = ConcurrencyController(initial_limit=INITIAL_CONCURRENT_API_CALLS,
+                                       max_limit=MAX_CONCURRENT_API_CALLS)
+
+# Pooled HTTP connections shared by all threads, kept alive across calls
+_session = requests.Session()
+_session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=MAX_CONCURRENT_API_CALLS))
+_session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=MAX_CONCURRENT_API_CALLS))
 
 # Jitter range (seconds)
 JITTER_MIN = 0.1
 JITTER_MAX = 0.2
-NUM_WORKERS = 20
 
 def call_model(prompt: str,
                system: str = "",
                model: str = MODEL,
                temperature: float = 0.0,
                timeout: int = 30,
-               max_tokens: int = 256) -> dict:
+               max_tokens: int = 256,
+               logprobs: int | None = None) -> dict:
 
-    url = f"{API_BASE}/completions"
-    headers = {
-        "Authorization": f"Bearer {API_KEY}",
-        "Content-Type":  "application/json",
-    }
+    payload = _build_payload(prompt, system, model, temperature, max_tokens, logprobs)
+    result = _post_completions(payload, timeout)
+
+    if result["ok"]:
+        data = result["raw"]
+        result["text"] = data.get("choices", [{}])[0].get("text", "").strip()
+    return result
+
+
+def call_model_batch(prompts: list[str],
+                     system: str = "",
+                     model: str = MODEL,
+                     temperature: float = 0.0,
+                     timeout: int = 30,
+                     max_tokens: int = 256,
+                     logprobs: int | None = None) -> list[dict]:
+    """
+    Send several prompts sharing one system prefix and settings in a single
+    /completions request. Returns one call_model-shaped result per prompt,
+    with `raw["choices"]` holding only that prompt's choice.
+    """
+    payload = _build_payload(list(prompts), system, model, temperature, max_tokens, logprobs)
+    result = _post_completions(payload, timeout)
+
+    if not result["ok"]:
+        return [dict(result) for _ in prompts]
 
+    data = result["raw"]
+    by_index = {c.get("index", i): c for i, c in enumerate(data.get("choices", []))}
+    results = []
+    for i in range(len(prompts)):
+        choice = by_index.get(i)
+        if choice is None:
+            results.append({"ok": False, "text": None, "raw": None, "status": result["status"],
+                            "error": f"No choice returned for prompt {i}", "headers": result["headers"]})
+            continue
+        raw = dict(data)
+        raw["choices"] = [choice]
+        results.append({"ok": True, "text": (choice.get("text") or "").strip(), "raw": raw,
+                        "status": result["status"], "error": None, "headers": result["headers"]})
+    return results
+
+
+def _build_payload(prompt, system, model, temperature, max_tokens, logprobs) -> dict:
     payload = {
         "model": model,
         "prompt": prompt,
@@ -43,6 +89,18 @@ def call_model(prompt: str,
         "max_tokens": max_tokens,
         "echo": False,
     }
+    if logprobs is not None:
+        # Return the top-k alternatives for each generated token
+        payload["logprobs"] = logprobs
+    return payload
+
+
+def _post_completions(payload: dict, timeout: int) -> dict:
+    url = f"{API_BASE}/completions"
+    headers = {
+        "Authorization": f"Bearer {API_KEY}",
+        "Content-Type":  "application/json",
+    }
 
     last_error = None
     for attempt in range(MAX_RETRIES):
@@ -57,23 +115,23 @@ def call_model(prompt: str,
                 extra_jitter = random.uniform(0, backoff * 0.3)
                 time.sleep(backoff + extra_jitter)
             
-            # Acquire semaphore before making API call
-            with _api_semaphore:
-                resp = requests.post(url, headers=headers, json=payload, timeout=timeout)
+            # Acquire a slot from the shared controller before making API call
+            with api_controller.slot() as started:
+                resp = _session.post(url, headers=headers, json=payload, timeout=timeout)
             
             status = resp.status_code
             hdrs = dict(resp.headers)
 
             if status == 200:
                 data = resp.json()
-                text = data.get("choices", [{}])[0].get("text", "").strip()
-                return {"ok": True, "text": text, "raw": data, "status": status, "error": None, "headers": hdrs}
+                return {"ok": True, "text": None, "raw": data, "status": status, "error": None, "headers": hdrs}
 
             # Check for rate limit error - retry
             try:
                 err_data = resp.json()
                 err_text = str(err_data)
                 if "rate_limit" in err_text.lower() or "too many" in err_text.lower():
+                    api_controller.record_overload(started)
                     last_error = err_text
                     continue
             except Exception:
@@ -0,0 +1,96 @@
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from agent import api_client
+
+# Max prompts sent in one multi-prompt call, and how long the first prompt
+# of a batch waits for others to join it
+MICRO_BATCH_SIZE = 32
+MICRO_BATCH_WAIT = 0.05
+
+
+class PromptBatcher:
+    """
+    Micro-batches single-shot completions. Callers block in call() while
+    prompts that share a system prefix and settings are collected, then
+    sent together as one multi-prompt /completions request.
+    """
+
+    def __init__(self,
+                 batch_size: int = MICRO_BATCH_SIZE,
+                 batch_wait: float = MICRO_BATCH_WAIT):
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+
+        self._queue: queue.Queue = queue.Queue()
+        # Batches are sent off the collector thread so it keeps collecting
+        self._senders = ThreadPoolExecutor(max_workers=api_client.MAX_CONCURRENT_API_CALLS)
+        self._lock = threading.Lock()
+        self._stats = {"prompts": 0, "batches": 0, "largest_batch": 0, "errors": 0}
+
+        self._collector = threading.Thread(target=self._collect_loop, daemon=True)
+        self._collector.start()
+
+    def call(self, prompt: str, system: str = "", **params) -> dict:
+        """Same arguments and result shape as api_client.call_model."""
+        future: Future = Future()
+        key = (system, tuple(sorted(params.items())))
+        self._queue.put((key, prompt, future))
+        return future.result()
+
+    def _collect_loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # One request per distinct system prefix + settings
+            groups: dict[tuple, list] = {}
+            for key, prompt, future in batch:
+                groups.setdefault(key, []).append((prompt, future))
+            for key, entries in groups.items():
+                try:
+                    self._senders.submit(self._send, key, entries)
+                except Exception as e:
+                    self._fail(entries, e)
+
+    def _send(self, key: tuple, entries: list) -> None:
+        system, params = key
+        try:
+            results = api_client.call_model_batch([p for p, _ in entries], system=system, **dict(params))
+        except Exception as e:
+            self._fail(entries, e)
+            return
+
+        with self._lock:
+            self._stats["prompts"] += len(entries)
+            self._stats["batches"] += 1
+            self._stats["largest_batch"] = max(self._stats["largest_batch"], len(entries))
+        for (_, future), result in zip(entries, results):
+            future.set_result(result)
+
+    def _fail(self, entries: list, error: Exception) -> None:
+        # Every waiter gets a failed result rather than hanging
+        print(f"[ERROR] Batched completion failed: {error}", file=sys.stderr)
+        with self._lock:
+            self._stats["errors"] += 1
+        for _, future in entries:
+            if not future.done():
+                future.set_result({"ok": False, "text": None, "raw": None, "status": -1,
+                                   "error": str(error), "headers": {}})
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["mean_batch"] = stats["prompts"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
@@ -0,0 +1,162 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class ConcurrencyController:
+    """
+    Adaptive limit on in-flight API requests.
+
+    Completed requests are grouped into measurement windows. After each
+    window the controller compares throughput with the previous window and
+    hill-climbs the limit: keep stepping in the same direction while
+    throughput improves, reverse when it drops. One slot more or less at
+    limit L changes throughput by at most 1/L, so "improves" and "drops"
+    are judged against half that, not a fixed percentage. If mean latency inflates
+    well past the best latency seen (or the server reports rate limiting)
+    the limit is cut multiplicatively instead.
+    """
+
+    def __init__(self,
+                 initial_limit: int = 8,
+                 min_limit: int = 1,
+                 max_limit: int = 64,
+                 min_window: int = 20,
+                 latency_tolerance: float = 2.0,
+                 backoff_factor: float = 0.75,
+                 clock=time.monotonic):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.min_window = min_window
+        self.latency_tolerance = latency_tolerance
+        self.backoff_factor = backoff_factor
+        self._clock = clock
+
+        self._limit = max(min_limit, min(initial_limit, max_limit))
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+        self._direction = 1
+        self._window_start = self._clock()
+        self._window_latencies: list[float] = []
+        self._settling = 0
+        self._last_throughput: float | None = None
+        self._baseline_latency: float | None = None
+        self._completed = 0
+        self._adjustments = 0
+        self._last_cut = float("-inf")
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    @contextmanager
+    def slot(self):
+        """
+        Hold one in-flight slot for the duration of a request.
+        Yields the request's start time, to pass back to record_overload.
+        """
+        with self._cond:
+            while self._in_flight >= self._limit:
+                self._cond.wait()
+            self._in_flight += 1
+        start = self._clock()
+        try:
+            yield start
+        finally:
+            latency = self._clock() - start
+            with self._cond:
+                self._in_flight -= 1
+                self._record(latency)
+                self._cond.notify_all()
+
+    def record_overload(self, started: float) -> None:
+        """
+        Server signalled overload (e.g. rate limit): back off immediately.
+        A burst of rejections from requests that were already in flight when
+        the limit was last cut counts as one signal, not one cut each.
+        """
+        with self._cond:
+            if started < self._last_cut:
+                return
+            self._cut()
+            self._reset_window()
+
+    def _cut(self) -> None:
+        self._set_limit(int(self._limit * self.backoff_factor))
+        self._direction = 1
+        self._last_cut = self._clock()
+
+    def _record(self, latency: float) -> None:
+        self._completed += 1
+        if self._settling > 0:
+            # Requests started under the previous limit; measuring them
+            # would credit the old limit's throughput to the new one
+            self._settling -= 1
+            if self._settling == 0:
+                self._window_start = self._clock()
+            return
+        self._window_latencies.append(latency)
+        if len(self._window_latencies) < max(self.min_window, 3 * self._limit):
+            return
+
+        now = self._clock()
+        elapsed = max(now - self._window_start, 1e-6)
+        throughput = len(self._window_latencies) / elapsed
+        mean_latency = sum(self._window_latencies) / len(self._window_latencies)
+
+        # Best latency seen, allowed to drift up slowly so a permanently
+        # slower server does not keep the limit pinned down forever
+        if self._baseline_latency is None:
+            self._baseline_latency = mean_latency
+        else:
+            self._baseline_latency = min(mean_latency, self._baseline_latency * 1.05)
+
+        if mean_latency > self._baseline_latency * self.latency_tolerance:
+            self._cut()
+        else:
+            if self._last_throughput is not None:
+                # Expected change from a one-slot step is ~1/limit
+                threshold = 0.5 / self._limit
+                if throughput < self._last_throughput * (1 - threshold):
+                    self._direction = -self._direction
+                elif throughput < self._last_throughput * (1 + threshold) and self._direction > 0:
+                    # Plateau after adding slots: past the knee, step back
+                    self._direction = -1
+            next_limit = self._limit + self._direction
+            if not self.min_limit <= next_limit <= self.max_limit:
+                self._direction = -self._direction
+                next_limit = self._limit + self._direction
+            self._set_limit(next_limit)
+
+        self._last_throughput = throughput
+        self._reset_window()
+
+    def _set_limit(self, new_limit: int) -> None:
+        new_limit = max(self.min_limit, min(new_limit, self.max_limit))
+        if new_limit != self._limit:
+            self._limit = new_limit
+            self._adjustments += 1
+
+    def _reset_window(self) -> None:
+        self._window_start = self._clock()
+        self._window_latencies = []
+        self._settling = self._in_flight
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "limit": self._limit,
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "adjustments": self._adjustments,
+                "throughput": self._last_throughput,
+                "baseline_latency": self._baseline_latency,
+            }
+
+    def print_stats(self) -> None:
+        s = self.stats()
+        throughput = f"{s['throughput']:.2f} req/s" if s["throughput"] else "n/a"
+        latency = f"{s['baseline_latency']:.2f}s" if s["baseline_latency"] else "n/a"
+        print(f"[CONCURRENCY] limit={s['limit']} completed={s['completed']} "
+              f"adjustments={s['adjustments']} throughput={throughput} best_latency={latency}")
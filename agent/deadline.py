@@ -0,0 +1,87 @@
+import threading
+import time
+from collections import deque
+
+
+class DeadlineTracker:
+    """
+    Projects when a run will finish from its recent completion rate and
+    says whether strategies should be degraded to meet a wall-clock budget.
+
+    Degrades once the projected finish passes the deadline and upgrades
+    again only when it is comfortably ahead (`upgrade_margin`), so the mode
+    does not flap on every completion.
+    """
+
+    def __init__(self,
+                 total: int,
+                 deadline_seconds: float,
+                 min_samples: int = 20,
+                 rate_window: int = 100,
+                 upgrade_margin: float = 0.85):
+        self.total = total
+        self.deadline_seconds = deadline_seconds
+        self.min_samples = min_samples
+        self.upgrade_margin = upgrade_margin
+
+        self._start = time.monotonic()
+        self._done = 0
+        self._recent: deque[float] = deque(maxlen=rate_window)
+        self._degraded = False
+        self._switches = 0
+        self._lock = threading.Lock()
+
+    def record_done(self) -> None:
+        with self._lock:
+            self._done += 1
+            self._recent.append(time.monotonic())
+            self._update()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self._start
+
+    def projected_total_seconds(self) -> float | None:
+        """Projected wall-clock time for the whole run, or None if too early to tell."""
+        with self._lock:
+            return self._projection()
+
+    def should_degrade(self) -> bool:
+        with self._lock:
+            # Out of time: everything left gets the cheapest strategy
+            if self.elapsed() >= self.deadline_seconds:
+                return True
+            return self._degraded
+
+    def _projection(self) -> float | None:
+        if self._done < self.min_samples or len(self._recent) < 2:
+            return None
+        span = self._recent[-1] - self._recent[0]
+        if span <= 0:
+            return None
+        # Recent rate reflects the current strategy mix and server speed
+        rate = (len(self._recent) - 1) / span
+        remaining = self.total - self._done
+        return self.elapsed() + remaining / rate
+
+    def _update(self) -> None:
+        projected = self._projection()
+        if projected is None:
+            return
+        if not self._degraded and projected > self.deadline_seconds:
+            self._degraded = True
+            self._switches += 1
+            print(f"[DEADLINE] Projected {projected:.0f}s > {self.deadline_seconds:.0f}s budget, degrading strategies")
+        elif self._degraded and projected < self.deadline_seconds * self.upgrade_margin:
+            self._degraded = False
+            self._switches += 1
+            print(f"[DEADLINE] Projected {projected:.0f}s, back ahead of budget, restoring full strategies")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "done": self._done,
+                "elapsed": self.elapsed(),
+                "projected": self._projection(),
+                "degraded": self._degraded,
+                "switches": self._switches,
+            }
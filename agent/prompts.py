@@ -0,0 +1,99 @@
+import hashlib
+import threading
+
+# Rough characters-per-token ratio used for the prefix-hit estimates
+CHARS_PER_TOKEN = 4
+
+
+class PromptTemplate:
+    """
+    A prompt with a byte-identical static prefix and a variable tail.
+    The prefix is sent through the `system` field so a prefix-caching
+    server can reuse its KV state; only the tail changes per question.
+    """
+
+    def __init__(self, name: str, prefix: str, tail: str):
+        self.name = name
+        self.prefix = prefix
+        self.tail = tail
+
+    def render(self, **fields) -> tuple[str, str]:
+        """Returns (system, prompt) ready to pass to call_model."""
+        return self.prefix, self.tail.format(**fields)
+
+
+_templates: dict[str, PromptTemplate] = {}
+_stats: dict[str, dict[str, int]] = {}
+_lock = threading.Lock()
+
+
+def register_template(name: str, prefix: str, tail: str) -> PromptTemplate:
+    """
+    Register a template once at import time. Re-registering the same name
+    with a different prefix is an error, since it would silently break reuse.
+    """
+    with _lock:
+        existing = _templates.get(name)
+        if existing is not None:
+            if existing.prefix != prefix or existing.tail != tail:
+                raise ValueError(f"Template {name!r} already registered with different text")
+            return existing
+        template = PromptTemplate(name, prefix, tail)
+        _templates[name] = template
+        _stats[name] = {"requests": 0, "hits": 0}
+        return template
+
+
+def get_template(name: str) -> PromptTemplate:
+    return _templates[name]
+
+
+def template_digest(name: str) -> str:
+    """Short hash of a template's text, used in strategy fingerprints."""
+    template = _templates[name]
+    text = template.prefix + "\0" + template.tail
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+
+
+def build_prompt(name: str, **fields) -> tuple[str, str]:
+    """
+    Render a registered template and record it for the prefix-hit estimate.
+    The first request for a prefix is counted as a miss, every later one as
+    a hit (assuming the server keeps the prefix warm).
+    """
+    template = _templates[name]
+    with _lock:
+        stats = _stats[name]
+        if stats["requests"] > 0:
+            stats["hits"] += 1
+        stats["requests"] += 1
+    return template.render(**fields)
+
+
+def prefix_stats() -> dict[str, dict[str, float]]:
+    """Per-template request counts, estimated hit rate and tokens reused."""
+    report = {}
+    with _lock:
+        for name, stats in _stats.items():
+            requests = stats["requests"]
+            hits = stats["hits"]
+            prefix_tokens = len(_templates[name].prefix) // CHARS_PER_TOKEN
+            report[name] = {
+                "requests": requests,
+                "hits": hits,
+                "hit_rate": hits / requests if requests else 0.0,
+                "prefix_tokens": prefix_tokens,
+                "tokens_reused": hits * prefix_tokens,
+            }
+    return report
+
+
+def print_prefix_stats() -> None:
+    report = prefix_stats()
+    total_requests = sum(r["requests"] for r in report.values())
+    total_reused = sum(r["tokens_reused"] for r in report.values())
+    print(f"[PREFIX] {total_requests} templated requests, ~{total_reused} prompt tokens reusable from cache")
+    for name, r in report.items():
+        if r["requests"]:
+            print(f"[PREFIX]   {name}: {r['hits']}/{r['requests']} hits "
+                  f"({100 * r['hit_rate']:.1f}%), ~{r['prefix_tokens']} tokens/prefix")
@@ -1,5 +1,136 @@
-from agent.api_client import call_model
-from evaluation import extract_number
+import hashlib
+import math
+from concurrent.futures import ThreadPoolExecutor
+from agent.api_client import call_model, MAX_CONCURRENT_API_CALLS
+from agent.prompts import register_template, build_prompt, template_digest
+from evaluation import extract_number, normalize_text
+
+# Bump a strategy's version whenever its code changes in a way that could
+# change answers. Prompt text changes are picked up from the templates.
+STRATEGY_VERSIONS = {
+    "factoid": 1,
+    "cot": 1,
+    "self_critique": 1,
+    "self_consistency": 1,
+    "mc_logprob": 3,
+}
+
+# Strategies each top-level strategy calls into (including itself)
+STRATEGY_DEPENDENCIES = {
+    "factoid": ["factoid"],
+    "cot": ["cot"],
+    "self_critique": ["self_critique", "cot"],
+    "self_consistency": ["self_consistency", "cot"],
+    "mc_logprob": ["mc_logprob", "cot"],
+}
+
+# Speculative self-critique: run CoT and factoid answers in parallel and only
+# critique when they disagree. Saves a round trip on most non-math questions
+# at the cost of an extra short call when the serial path would skip critique
+SPECULATIVE_CRITIQUE = False
+
+# Shared pool for the speculative factoid calls; the CoT call runs on the
+# caller's thread, so one extra thread per in-flight question is enough
+_speculative_pool = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_API_CALLS)
+
+# Optional PromptBatcher for single-shot calls (factoid, MC logprob); set by
+# long-running callers such as agent_service.py
+_single_shot_batcher = None
+
+# Number of alternatives requested for the single MC answer token
+MC_LOGPROB_TOP_K = 5
+MC_LETTERS = ("A", "B", "C", "D")
+# Below this probability margin between the top two letters the logprob
+# answer is not trusted and the generative CoT path decides instead
+MC_MIN_MARGIN = 0.1
+# The top letter must also carry this much absolute probability; a lone
+# letter far down the top-k says little about the answer
+MC_MIN_PROB = 0.3
+
+# Static instruction text lives in the template prefixes (sent as `system`),
+# the question and other per-item text go in the tail.
+_STRICT_RULES = (
+    "STRICT RULES:\n"
+    "- Do NOT explain your reasoning.\n"
+    "- Do NOT show any work or steps.\n"
+    "- Do NOT write more than one line.\n"
+    "- Respond with ONLY this format:\n"
+    "FINAL: <answer>\n"
+)
+_QUESTION_TAIL = "Question:\n{question}\n"
+
+register_template(
+    "factoid",
+    "Answer the question with ONLY the short final answer.\n"
+    "No explanation. No reasoning. No chain of thought.\n"
+    "If the answer is a number, output only the number.\n"
+    "If the answer is a name, output only the name.\n"
+    "If the answer is a single letter (A/B/C/D), output only that.\n"
+    "Final answer only:\n",
+    _QUESTION_TAIL,
+)
+register_template(
+    "cot_mc",
+    "You are answering a multiple-choice question.\n"
+    "Choose only one letter: A, B, C, or D.\n" + _STRICT_RULES,
+    _QUESTION_TAIL,
+)
+register_template(
+    "cot_yesno",
+    "Answer the question with only Yes or No.\n" + _STRICT_RULES,
+    _QUESTION_TAIL,
+)
+register_template(
+    "cot_numeric",
+    "Solve the math question. Answer with only the final numeric value.\n" + _STRICT_RULES,
+    _QUESTION_TAIL,
+)
+register_template(
+    "cot_factoid",
+    "Answer the question with a short factoid phrase.\n" + _STRICT_RULES,
+    _QUESTION_TAIL,
+)
+register_template(
+    "mc_logprob",
+    "You are answering a multiple-choice question.\n"
+    "Respond with only the letter of the correct option: A, B, C, or D.\n",
+    "Question:\n{question}\n\nAnswer:",
+)
+register_template(
+    "critique",
+    "You will see a question and a proposed answer.\n"
+    "Decide if the proposed answer is correct.\n"
+    "If correct, repeat it. If incorrect, give the correct short final answer.\n"
+    "STRICT RULE: Respond ONLY as:\n"
+    "FINAL: <answer>\n"
+    "Do NOT include explanations.\n"
+    "Do NOT continue the sentence after the answer.\n"
+    "The answer must be a COMPLETE standalone phrase.\n",
+    "Question:\n{question}\n\nProposed answer:\n{answer}\n",
+)
+register_template(
+    "critique_pair",
+    "You will see a question and two candidate answers that disagree.\n"
+    "Decide which candidate is correct. If neither is, give the correct short final answer.\n"
+    "STRICT RULE: Respond ONLY as:\n"
+    "FINAL: <answer>\n"
+    "Do NOT include explanations.\n"
+    "Do NOT continue the sentence after the answer.\n"
+    "The answer must be a COMPLETE standalone phrase.\n",
+    "Question:\n{question}\n\nCandidate 1:\n{first}\n\nCandidate 2:\n{second}\n",
+)
+
+def set_single_shot_batcher(batcher) -> None:
+    """Route single-shot calls through a PromptBatcher (None to disable)."""
+    global _single_shot_batcher
+    _single_shot_batcher = batcher
+
+
+def _call_single_shot(prompt: str, system: str = "", **params) -> dict:
+    if _single_shot_batcher is not None:
+        return _single_shot_batcher.call(prompt, system=system, **params)
+    return call_model(prompt, system=system, **params)
+
 
 def extract_final_answer(text: str) -> str:
     """
@@ -46,17 +177,9 @@ def run_factoid(question: str, domain: str | None = None) -> str:
     """
     q = (question or "").strip()
 
-    prompt = (
-        "Answer the question with ONLY the short final answer.\n"
-        "No explanation. No reasoning. No chain of thought.\n"
-        "If the answer is a number, output only the number.\n"
-        "If the answer is a name, output only the name.\n"
-        "If the answer is a single letter (A/B/C/D), output only that.\n"
-        "Final answer only:\n\n"
-        f"Question:\n{q}\n"
-    )
+    system, prompt = build_prompt("factoid", question=q)
 
-    result = call_model(prompt, temperature=0.0)
+    result = _call_single_shot(prompt, system=system, temperature=0.0)
 
     if not result.get("ok"):
         return "ERROR"
@@ -71,45 +194,38 @@ def run_factoid(question: str, domain: str | None = None) -> str:
     return extract_final_answer(ans)
 
 
-def run_cot(question: str, domain: str | None = None) -> str:
+def is_multiple_choice(question: str) -> bool:
+    q = (question or "").strip()
+    return "Options:" in q and "(A" in q
+
+
+def cot_template_name(question: str) -> str:
     """
-    Unified prompting strategy. Forces model to output: FINAL: <answer>
+    Pick the CoT template for a question: MC, yes/no, numeric or factoid.
     """
     q = (question or "").strip()
 
-    is_mc = "Options:" in q and "(A" in q
+    is_mc = is_multiple_choice(q)
     is_yesno = q.lower().startswith(("is ", "does ", "do "))
     has_digit = any(ch.isdigit() for ch in q)
 
     if is_mc:
-        instruction = (
-            "You are answering a multiple-choice question.\n"
-            "Choose only one letter: A, B, C, or D.\n"
-        )
-    elif is_yesno:
-        instruction = (
-            "Answer the question with only Yes or No.\n"
-        )
-    elif has_digit:
-        instruction = (
-            "Solve the math question. Answer with only the final numeric value.\n"
-        )
-    else:
-        instruction = (
-            "Answer the question with a short factoid phrase.\n"
-        )
-
-    instruction += (
-        "STRICT RULES:\n"
-        "- Do NOT explain your reasoning.\n"
-        "- Do NOT show any work or steps.\n"
-        "- Do NOT write more than one line.\n"
-        "- Respond with ONLY this format:\n"
-        "FINAL: <answer>\n\n"
-        f"Question:\n{q}\n"
-    )
-
-    result = call_model(instruction, temperature=0.0)
+        return "cot_mc"
+    if is_yesno:
+        return "cot_yesno"
+    if has_digit:
+        return "cot_numeric"
+    return "cot_factoid"
+
+
+def run_cot(question: str, domain: str | None = None) -> str:
+    """
+    Unified prompting strategy. Forces model to output: FINAL: <answer>
+    """
+    q = (question or "").strip()
+
+    system, prompt = build_prompt(cot_template_name(q), question=q)
+    result = call_model(prompt, system=system, temperature=0.0)
 
     if not result.get("ok"):
         return "MODEL_CALL_FAILED"
@@ -142,30 +258,62 @@ def run_self_critique(question: str, domain: str | None = None) -> str:
     """
     Self-critique: get initial answer, then verify/correct it.
     """
+    if SPECULATIVE_CRITIQUE:
+        return _run_self_critique_speculative(question, domain)
+
     initial = run_cot(question, domain)
-    clean_init = initial.strip()
+    return _critique_answer(question, initial.strip())
 
+
+def _critique_answer(question: str, clean_init: str) -> str:
+    """
+    Ask the model to confirm or correct a single proposed answer.
+    """
     # Short stable answers don't need critique
     if clean_init and len(clean_init) <= 12 and " " not in clean_init:
         return clean_init
 
-    critique_prompt = (
-        "You will see a question and a proposed answer.\n"
-        "Decide if the proposed answer is correct.\n"
-        "If correct, repeat it. If incorrect, give the correct short final answer.\n"
-        "STRICT RULE: Respond ONLY as:\n"
-        "FINAL: <answer>\n"
-        "Do NOT include explanations.\n"
-        "Do NOT continue the sentence after the answer.\n"
-        "The answer must be a COMPLETE standalone phrase.\n\n"
-        f"Question:\n{question}\n\n"
-        f"Proposed answer:\n{clean_init}\n"
-    )
-
-    result = call_model(critique_prompt, temperature=0.0)
+    system, critique_prompt = build_prompt("critique", question=question, answer=clean_init)
+
+    result = call_model(critique_prompt, system=system, temperature=0.0)
     if not result.get("ok"):
         return clean_init
 
+    return _extract_critique_answer(result)
+
+
+def _run_self_critique_speculative(question: str, domain: str | None = None) -> str:
+    """
+    Speculative self-critique: run CoT and a cheap factoid answer in
+    parallel, accept when they agree, and only critique when they differ.
+    """
+    factoid_future = _speculative_pool.submit(run_factoid, question, domain)
+    initial = run_cot(question, domain).strip()
+    quick = factoid_future.result().strip()
+
+    failed = {"", "ERROR", "MODEL_CALL_FAILED"}
+    if quick in failed:
+        # No second opinion, fall back to the serial critique
+        return _critique_answer(question, initial)
+    if initial in failed:
+        return quick
+
+    if normalize_text(initial) == normalize_text(quick):
+        return initial
+
+    system, critique_prompt = build_prompt("critique_pair", question=question, first=initial, second=quick)
+
+    result = call_model(critique_prompt, system=system, temperature=0.0)
+    if not result.get("ok"):
+        return initial
+
+    return _extract_critique_answer(result)
+
+
+def _extract_critique_answer(result: dict) -> str:
+    """
+    Pull the FINAL answer out of a critique response and sanitize it.
+    """
     raw = (result.get("text") or "").strip()
 
     extracted = None
@@ -267,3 +415,92 @@ def run_self_consistency(question: str, domain: str | None = None, num_samples:
 
     best_answer = max(counts.items(), key=lambda x: x[1])[0]
     return best_answer
+
+
+def score_mc_logprobs(question: str) -> tuple[str, float, float] | None:
+    """
+    Ask for a single token with logprobs and score A-D from its top-k.
+    Returns (letter, margin, prob): prob is the best letter's absolute
+    probability and margin its gap to the second-best letter (0 if absent).
+    Returns None if the call fails or no letter is in the top-k.
+    """
+    q = (question or "").strip()
+
+    system, prompt = build_prompt("mc_logprob", question=q)
+    result = _call_single_shot(prompt, system=system, temperature=0.0,
+                               max_tokens=1, logprobs=MC_LOGPROB_TOP_K)
+
+    if not result.get("ok"):
+        return None
+
+    try:
+        top = result["raw"]["choices"][0]["logprobs"]["top_logprobs"][0] or {}
+    except (KeyError, IndexError, TypeError):
+        return None
+
+    # Several tokens can spell the same letter (" A", "A", "(A")
+    probs: dict[str, float] = {}
+    for token, logprob in top.items():
+        # Uppercase only: a lowercase " a" is the article, not option A
+        letter = token.strip().strip("()[]:.")
+        if letter in MC_LETTERS and logprob is not None:
+            probs[letter] = probs.get(letter, 0.0) + math.exp(logprob)
+
+    if not probs:
+        return None
+
+    ranked = sorted(probs.values(), reverse=True)
+    second = ranked[1] if len(ranked) > 1 else 0.0
+    margin = ranked[0] - second
+    best = max(probs, key=probs.get)
+    return best, margin, ranked[0]
+
+
+def run_mc_logprob(question: str, domain: str | None = None) -> str:
+    """
+    MC fast path: one single-token call scored from logprobs.
+    Falls back to run_cot when no letter shows up in the top-k, the best
+    letter's probability is below MC_MIN_PROB, or the margin between the
+    top two letters is below MC_MIN_MARGIN.
+    """
+    scored = score_mc_logprobs(question)
+    if scored is None:
+        return run_cot(question, domain)
+    letter, margin, prob = scored
+    if prob < MC_MIN_PROB or margin < MC_MIN_MARGIN:
+        return run_cot(question, domain)
+    return letter
+
+
+def strategy_templates(strategy: str, question: str) -> list[str]:
+    """
+    Prompt templates a strategy will use for this question.
+    """
+    if strategy == "factoid":
+        return ["factoid"]
+    if strategy == "mc_logprob":
+        return ["mc_logprob", cot_template_name(question)]
+    if strategy == "self_critique":
+        if SPECULATIVE_CRITIQUE:
+            return [cot_template_name(question), "factoid", "critique", "critique_pair"]
+        return [cot_template_name(question), "critique"]
+    return [cot_template_name(question)]
+
+
+def strategy_fingerprint(strategy: str, question: str) -> str:
+    """
+    Fingerprint of everything that decides the answer for this question:
+    the strategy, the versions of the strategies it calls and the text of
+    the templates it uses. Only changes that touch this question's path
+    change its fingerprint.
+    """
+    parts = [strategy]
+    deps = list(STRATEGY_DEPENDENCIES[strategy])
+    if strategy == "self_critique" and SPECULATIVE_CRITIQUE:
+        parts.append("speculative")
+        deps.append("factoid")
+    for dep in deps:
+        parts.append(f"{dep}:v{STRATEGY_VERSIONS[dep]}")
+    for name in strategy_templates(strategy, question):
+        parts.append(f"{name}:{template_digest(name)}")
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:16]
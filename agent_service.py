@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Long-running agent service.
+
+Wraps CoreAgent behind two local interfaces so pipelines can feed questions
+continuously instead of relaunching the batch script:
+
+  python agent_service.py                 # JSONL over stdin/stdout
+  python agent_service.py --http 8476     # local HTTP on 127.0.0.1:8476
+
+Each request is a JSON object {"id": ..., "input": ..., "domain": ...}.
+Answers are streamed back as JSON lines as soon as they complete, in
+completion order, tagged with the request id.
+
+Each question is dispatched as soon as it arrives. Identical questions that
+are in flight or were answered earlier are computed once. Single-shot model
+calls (factoid answers and MC logprob scoring) are micro-batched: calls that
+share a prompt prefix and settings are collected for up to MICRO_BATCH_WAIT
+and sent as one multi-prompt /completions request. The pooled API
+connections, batcher, prompt-prefix stats, answer cache and adaptive
+concurrency controller all live for the lifetime of the process.
+
+HTTP endpoints:
+  POST /answer   body: one JSON object, a JSON list, or JSONL; streams JSONL back
+  GET  /stats    service, concurrency and prefix-cache statistics
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List
+
+from agent.agent_core import CoreAgent
+from agent.api_client import api_controller
+from agent.batching import PromptBatcher
+from agent.strategies import set_single_shot_batcher
+from agent.prompts import prefix_stats
+
+# Answers kept in memory across jobs, keyed by strategy fingerprint + question
+ANSWER_CACHE_SIZE = 50000
+
+Callback = Callable[[Dict[str, Any]], None]
+
+
+class AgentService:
+    """
+    Warm front end for CoreAgent. Call submit() from any thread; the
+    callback receives the answer record once it is ready.
+    """
+
+    def __init__(self, cache_size: int = ANSWER_CACHE_SIZE):
+        self.cache_size = cache_size
+
+        self.agent = CoreAgent()
+        self.batcher = PromptBatcher()
+        set_single_shot_batcher(self.batcher)
+        # Workers keep the shared controller saturated; it decides real concurrency
+        self._pool = ThreadPoolExecutor(max_workers=api_controller.max_limit)
+        self._cache: OrderedDict[tuple[str, str], str] = OrderedDict()
+        self._in_progress: Dict[tuple[str, str], List[tuple[Dict[str, Any], Callback, float]]] = {}
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._idle = threading.Condition(self._lock)
+
+        self._stats = {"submitted": 0, "answered": 0, "cache_hits": 0, "coalesced": 0, "errors": 0}
+        self._started = time.monotonic()
+
+    def submit(self, item: Dict[str, Any], callback: Callback) -> None:
+        received = time.monotonic()
+        with self._lock:
+            self._pending += 1
+            self._stats["submitted"] += 1
+        try:
+            self._dispatch(item, callback, received)
+        except Exception as e:
+            # A bad item must not leave its caller (or wait_idle) hanging
+            print(f"[ERROR] Failed to dispatch {item.get('id')!r}: {e}", file=sys.stderr)
+            with self._lock:
+                self._stats["errors"] += 1
+            self._deliver([(item, callback, received)], "ERROR", cached=False)
+
+    def wait_idle(self) -> None:
+        """Block until every submitted question has been answered."""
+        with self._idle:
+            while self._pending:
+                self._idle.wait()
+
+    def _dispatch(self, item: Dict[str, Any], callback: Callback, received: float) -> None:
+        question = item["input"].strip()
+        key = (self.agent.fingerprint(question), question)
+
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self._stats["cache_hits"] += 1
+            elif key in self._in_progress:
+                # Same question already being computed, share its answer
+                self._in_progress[key].append((item, callback, received))
+                self._stats["coalesced"] += 1
+                return
+            else:
+                self._in_progress[key] = [(item, callback, received)]
+
+        if cached is not None:
+            self._deliver([(item, callback, received)], cached, cached=True)
+            return
+
+        try:
+            self._pool.submit(self._compute, key, item.get("domain"))
+        except Exception:
+            # Nothing will compute this key, so release everyone waiting on it
+            with self._lock:
+                waiters = self._in_progress.pop(key, [])
+                self._stats["errors"] += 1
+            self._deliver(waiters, "ERROR", cached=False)
+
+    def _compute(self, key: tuple[str, str], domain: str | None) -> None:
+        question = key[1]
+        try:
+            answer = self.agent.run(question, domain)
+        except Exception as e:
+            print(f"[ERROR] Service question failed: {e}", file=sys.stderr)
+            answer = "ERROR"
+
+        with self._lock:
+            waiters = self._in_progress.pop(key, [])
+            if answer != "ERROR":
+                self._cache[key] = answer
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            else:
+                self._stats["errors"] += 1
+
+        self._deliver(waiters, answer, cached=False)
+
+    def _deliver(self, waiters: list, answer: str, cached: bool) -> None:
+        now = time.monotonic()
+        for item, callback, received in waiters:
+            record = {
+                "id": item.get("id"),
+                "output": answer,
+                "cached": cached,
+                "latency": round(now - received, 3),
+            }
+            try:
+                callback(record)
+            except Exception as e:
+                print(f"[ERROR] Failed to deliver answer {item.get('id')!r}: {e}", file=sys.stderr)
+            with self._lock:
+                self._stats["answered"] += 1
+                self._pending -= 1
+                if not self._pending:
+                    self._idle.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            service = dict(self._stats)
+            service["pending"] = self._pending
+            service["cache_size"] = len(self._cache)
+        service["uptime"] = round(time.monotonic() - self._started, 1)
+        return {
+            "service": service,
+            "batching": self.batcher.stats(),
+            "concurrency": api_controller.stats(),
+            "prefix": prefix_stats(),
+        }
+
+
+def parse_items(text: str) -> List[Dict[str, Any]]:
+    """Accept one JSON object, a JSON list of objects, or JSONL."""
+    text = text.strip()
+    if not text:
+        return []
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    if isinstance(data, list):
+        return data
+    return [data]
+
+
+def is_valid_item(item: Any) -> bool:
+    return isinstance(item, dict) and isinstance(item.get("input"), str)
+
+
+def serve_stdin(service: AgentService) -> None:
+    """Read JSONL questions from stdin, stream JSONL answers to stdout."""
+    out_lock = threading.Lock()
+
+    def write(record: Dict[str, Any]) -> None:
+        with out_lock:
+            sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+            sys.stdout.flush()
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+            if not is_valid_item(item):
+                raise ValueError("expected an object with a string 'input' field")
+        except ValueError as e:
+            write({"id": None, "error": f"Bad request line: {e}"})
+            continue
+        service.submit(item, write)
+
+    service.wait_idle()
+
+
+def make_handler(service: AgentService):
+    class Handler(BaseHTTPRequestHandler):
+        # HTTP/1.0: the streamed body ends when the connection closes
+        protocol_version = "HTTP/1.0"
+
+        def do_GET(self):
+            if self.path != "/stats":
+                self.send_error(404)
+                return
+            body = json.dumps(service.stats(), indent=2).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            if self.path != "/answer":
+                self.send_error(404)
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                items = parse_items(self.rfile.read(length).decode("utf-8"))
+                if not all(is_valid_item(i) for i in items):
+                    raise ValueError("every item needs a string 'input' field")
+            except ValueError as e:
+                self.send_error(400, f"Bad request: {e}")
+                return
+
+            results: queue.Queue = queue.Queue()
+            for item in items:
+                service.submit(item, results.put)
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            for _ in items:
+                record = results.get()
+                try:
+                    self.wfile.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+                except OSError:
+                    # Client went away; remaining answers still land in the cache
+                    return
+
+        def log_message(self, format, *args):
+            print(f"[HTTP] {self.address_string()} {format % args}", file=sys.stderr)
+
+    return Handler
+
+
+def serve_http(service: AgentService, port: int) -> None:
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(service))
+    print(f"[SERVICE] Listening on http://127.0.0.1:{port} (POST /answer, GET /stats)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Long-running CoreAgent service")
+    parser.add_argument("--http", type=int, metavar="PORT",
+                        help="serve HTTP on 127.0.0.1:PORT instead of JSONL over stdin")
+    args = parser.parse_args()
+
+    service = AgentService()
+    if args.http is not None:
+        serve_http(service, args.http)
+    else:
+        serve_stdin(service)
+    print(f"[SERVICE] {json.dumps(service.stats()['service'])}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -33,7 +33,7 @@ def grade(expected: str, got: str, kind: str = "text") -> bool:
 
 import concurrent.futures
 
-def evaluate_agent(agent, data, max_examples: int | None = None, num_workers: int = 1):
+def evaluate_agent(agent, data, max_examples: int | None = None, num_workers: int | None = None):
     # Figure out how many examples to actually evaluate
     n = len(data)
     if max_examples is not None and max_examples < n:
@@ -48,6 +48,11 @@ def evaluate_agent(agent, data, max_examples: int | None = None, num_workers: in
     total = 0
     num_correct = 0
 
+    # By default size the pool from the shared API concurrency controller
+    if num_workers is None:
+        from agent.api_client import api_controller
+        num_workers = api_controller.max_limit
+
     print(f"Evaluating {n} examples using {num_workers} workers...")
 
     def process_item(item):
@@ -16,17 +16,25 @@ from pathlib import Path
 from typing import Any, Dict, List
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from agent.agent_core import CoreAgent
+from agent.prompts import print_prefix_stats
+from agent.api_client import api_controller
+from agent.deadline import DeadlineTracker
 
 # Set to None to run all questions, or a number to limit for testing
 NUM_TEST_QUESTIONS = None
 
-# Number of parallel workers - adjust based on API rate limits
-# Using 20 workers for increased throughput
-NUM_WORKERS = 20
-
 # Save checkpoint every N completed questions
 CHECKPOINT_INTERVAL = 100
 
+# Re-run only questions whose strategy fingerprint (route + strategy/prompt
+# versions) no longer matches the one stored in the checkpoint
+RERUN_CHANGED_ONLY = False
+
+# Wall-clock budget for the run in seconds, or None for no deadline. When the
+# projected finish passes it, strategies are downgraded (self-consistency to
+# a single CoT call, critique to factoid) until the run is ahead again
+RUN_DEADLINE_SECONDS = None
+
 INPUT_PATH = Path("cse_476_final_project_test_data.json")
 OUTPUT_PATH = Path("cse_476_final_project_answers.json")
 CHECKPOINT_PATH = OUTPUT_PATH.with_suffix('.checkpoint.json')
@@ -94,22 +102,41 @@ def build_answers(questions: List[Dict[str, Any]]) -> List[Dict[str, str]]:
     Saves checkpoint every CHECKPOINT_INTERVAL questions.
     """
     total = len(questions)
-    print(f"Total questions: {total}, using {NUM_WORKERS} parallel workers")
+    # Workers only need to keep the controller saturated; it decides how
+    # many API calls are actually in flight
+    num_workers = api_controller.max_limit
+    print(f"Total questions: {total}, using {num_workers} parallel workers "
+          f"(adaptive API concurrency, starting at {api_controller.limit})")
 
     # Try to load existing checkpoint
     answers: List[Dict[str, str] | None] = [None] * total
     already_done = 0
+    fingerprint_agent = CoreAgent()
     
     if CHECKPOINT_PATH.exists():
         try:
             with CHECKPOINT_PATH.open("r", encoding="utf-8") as fp:
                 checkpoint_data = json.load(fp)
             if len(checkpoint_data) == total:
+                changed = 0
+                unfingerprinted = 0
                 for i, ans in enumerate(checkpoint_data):
                     if ans and ans.get("output") not in ("", "PENDING", "ERROR", None):
+                        if RERUN_CHANGED_ONLY:
+                            stored = ans.get("fingerprint")
+                            if stored is None:
+                                # Answers from before fingerprinting are kept as-is
+                                unfingerprinted += 1
+                            elif stored != fingerprint_agent.fingerprint(questions[i]["input"]):
+                                changed += 1
+                                continue
                         answers[i] = ans
                         already_done += 1
                 print(f"[RESUME] Loaded {already_done}/{total} completed answers from checkpoint")
+                if RERUN_CHANGED_ONLY:
+                    print(f"[RERUN] {changed} answers have a changed strategy fingerprint and will be recomputed")
+                    if unfingerprinted:
+                        print(f"[RERUN] {unfingerprinted} answers have no fingerprint and were kept")
         except Exception as e:
             print(f"[WARNING] Failed to load checkpoint: {e}")
     
@@ -120,6 +147,11 @@ def build_answers(questions: List[Dict[str, Any]]) -> List[Dict[str, str]]:
         return answers
     
     print(f"[RESUME] Processing {len(pending_indices)} remaining questions...")
+
+    deadline = None
+    if RUN_DEADLINE_SECONDS is not None:
+        deadline = DeadlineTracker(len(pending_indices), RUN_DEADLINE_SECONDS)
+        print(f"[DEADLINE] Budget of {RUN_DEADLINE_SECONDS}s for {len(pending_indices)} questions")
     
     def process_single(idx_and_question):
         """Process a single question. Returns (index, answer_dict)."""
@@ -130,7 +162,17 @@ def build_answers(questions: List[Dict[str, Any]]) -> List[Dict[str, str]]:
         domain = question.get("domain")
         
         try:
-            real_answer = agent.run(qtext, domain)
+            # Only questions whose route has a cheaper stand-in can be degraded
+            can_degrade = deadline is not None and agent.route(qtext, True) != agent.route(qtext)
+            degraded = can_degrade and deadline.should_degrade()
+            fingerprint = agent.fingerprint(qtext, degraded)
+            real_answer = agent.run(qtext, domain, degraded)
+
+            # Under a deadline, a failed full strategy gets one cheap retry
+            if can_degrade and real_answer == "ERROR" and not degraded:
+                degraded = True
+                fingerprint = agent.fingerprint(qtext, degraded)
+                real_answer = agent.run(qtext, domain, degraded)
             
             # Validation
             ok, err = validate_single_answer(qtext, real_answer)
@@ -143,7 +185,10 @@ def build_answers(questions: List[Dict[str, Any]]) -> List[Dict[str, str]]:
                 return (idx, {"output": "ERROR"})
             
             print(f"\n[Q{idx+1}] {qtext[:100]}...\n      -> {real_answer[:100]}...")
-            return (idx, {"output": real_answer})
+            result = {"output": real_answer, "fingerprint": fingerprint}
+            if degraded:
+                result["degraded"] = True
+            return (idx, result)
         except Exception as e:
             print(f"[ERROR] Q{idx+1} failed: {e}")
             return (idx, {"output": "ERROR"})
@@ -162,7 +207,7 @@ def build_answers(questions: List[Dict[str, Any]]) -> List[Dict[str, str]]:
     completed = already_done
     last_checkpoint = already_done
     
-    with ThreadPoolExecutor(max_workers=NUM_WORKERS) as executor:
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
         # Submit only pending tasks
         futures = {
             executor.submit(process_single, (idx, questions[idx])): idx 
@@ -174,6 +219,8 @@ def build_answers(questions: List[Dict[str, Any]]) -> List[Dict[str, str]]:
                 idx, result = future.result()
                 answers[idx] = result
                 completed += 1
+                if deadline:
+                    deadline.record_done()
                 
                 # Progress update every 50 questions
                 if completed % 50 == 0 or completed == total:
@@ -189,6 +236,8 @@ def build_answers(questions: List[Dict[str, Any]]) -> List[Dict[str, str]]:
                 print(f"[ERROR] Future {idx} raised exception: {e}")
                 answers[idx] = {"output": "ERROR"}
                 completed += 1
+                if deadline:
+                    deadline.record_done()
     
     # Final checkpoint save
     save_checkpoint(answers, completed)
@@ -198,10 +247,30 @@ def build_answers(questions: List[Dict[str, Any]]) -> List[Dict[str, str]]:
         if ans is None:
             print(f"[WARNING] Missing answer for question {i+1}, setting to ERROR")
             answers[i] = {"output": "ERROR"}
+
+    if deadline:
+        print_deadline_report(deadline, answers, pending_indices)
     
     return answers
 
 
+def print_deadline_report(deadline: DeadlineTracker,
+                          answers: List[Dict[str, Any]],
+                          run_indices: List[int]) -> None:
+    """
+    Summarise how this run did against its deadline and which of the items
+    it processed were degraded (answers resumed from a checkpoint are not counted).
+    """
+    stats = deadline.stats()
+    degraded = [i + 1 for i in run_indices if answers[i].get("degraded")]
+    on_time = "within" if stats["elapsed"] <= deadline.deadline_seconds else "OVER"
+    print(f"[DEADLINE] Finished in {stats['elapsed']:.0f}s, {on_time} the {deadline.deadline_seconds:.0f}s budget "
+          f"({stats['switches']} strategy mode switches)")
+    print(f"[DEADLINE] {len(degraded)}/{len(run_indices)} items answered with degraded strategies")
+    if degraded:
+        print(f"[DEADLINE] Degraded items: {', '.join(f'Q{n}' for n in degraded)}")
+
+
 
 def validate_results(
     questions: List[Dict[str, Any]], answers: List[Dict[str, Any]]
@@ -235,9 +304,14 @@ def main() -> None:
         print(f"Running on all {len(questions)} questions...")
     
     answers = build_answers(questions)
+    print_prefix_stats()
+    api_controller.print_stats()
     print("[DEBUG] All answers passed validation. Writing JSON...")
 
 
+    # Fingerprints stay in the checkpoint; the answer file only carries outputs
+    answers = [{"output": ans["output"]} for ans in answers]
+
     with OUTPUT_PATH.open("w", encoding="utf-8") as fp:
         json.dump(answers, fp, ensure_ascii=False, indent=2)
 
@@ -0,0 +1,63 @@
+from agent.concurrency import ConcurrencyController
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def simulate(controller, clock, knee, completions, base_latency=1.0):
+    """
+    Saturated closed-loop server: throughput scales linearly with the limit
+    up to `knee` in-flight requests and is flat beyond it.
+    """
+    limits = []
+    for _ in range(completions):
+        limit = controller.limit
+        throughput = min(limit, knee) / base_latency
+        clock.now += 1.0 / throughput
+        with controller._cond:
+            controller._in_flight = limit - 1
+            controller._record(limit / throughput)
+        limits.append(controller.limit)
+    return limits
+
+
+def test_limit_climbs_toward_knee_above_initial_limit():
+    clock = FakeClock()
+    controller = ConcurrencyController(initial_limit=20, max_limit=48, clock=clock)
+
+    limits = simulate(controller, clock, knee=40, completions=30000)
+
+    tail = limits[-5000:]
+    assert min(tail) >= 32
+    assert sum(tail) / len(tail) >= 36
+
+
+def test_limit_settles_near_knee_below_initial_limit():
+    clock = FakeClock()
+    controller = ConcurrencyController(initial_limit=20, max_limit=48, clock=clock)
+
+    limits = simulate(controller, clock, knee=8, completions=20000)
+
+    tail = limits[-5000:]
+    assert max(tail) <= 14
+    assert min(tail) >= 5
+
+
+def test_overload_burst_cuts_once():
+    clock = FakeClock()
+    controller = ConcurrencyController(initial_limit=20, max_limit=48, clock=clock)
+
+    starts = []
+    for _ in range(20):
+        with controller.slot() as started:
+            starts.append(started)
+    clock.now += 1.0
+    for started in starts:
+        controller.record_overload(started)
+
+    assert controller.limit == 15